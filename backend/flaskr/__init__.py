@@ -1,17 +1,90 @@
 import os
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
+from sqlalchemy import delete, func, text
+from sqlalchemy.exc import SQLAlchemyError
+from cachetools import TTLCache
+import orjson
+import hashlib
+import threading
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
 
 QUESTIONS_PER_PAGE = 10
 
+# tables estimated to hold at least this many rows are counted with the
+# planner's estimate when APPROXIMATE_QUESTION_COUNT is enabled
+APPROXIMATE_COUNT_THRESHOLD = 100000
+
+# Access Control header values set on every response
+_ACAH = 'Content-Type, Authorization, true'
+_ACAM = 'GET, POST, PATCH, DELETE, OPTIONS'
+
+# categories rarely change, so keep them per process for 5 minutes.
+# Clear this cache from any endpoint that changes categories.
+_categories_cache = TTLCache(maxsize=1, ttl=300)
+# TTLCache isn't thread safe and the workers serve requests from threads
+_categories_lock = threading.Lock()
+
+
+def jsonify(data):
+  """Serialize data to a JSON response with orjson
+  Non string keys are allowed as categories are keyed by id
+  """
+  return current_app.response_class(
+    orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS),
+    mimetype='application/json')
+
+
+def _format_categories(categories):
+  """Format categories to a dictionary of id to type"""
+  return {category.id: category.type for category in categories}
+
+
+def _approx_count(table):
+  """Return the planner's estimate of the number of rows in a table
+  The table name is resolved through the search_path
+  """
+  return db.session.execute(
+    text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)'),
+    {'table': table}).scalar()
+
+
+def _make_etag(*parts):
+  """Build an ETag from the values that identify a version of a response"""
+  return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _load_categories():
+  """Return the cached categories dictionary and its ETag"""
+  with _categories_lock:
+    # read the entry once, it may expire between two lookups
+    cached = _categories_cache.get('categories')
+
+    if cached is None:
+      categories = _format_categories(Category.query.order_by(Category.id).all())
+      cached = (categories, _make_etag(*sorted(categories.items())))
+      _categories_cache['categories'] = cached
+
+  return cached
+
+
+def _categories_dict():
+  """Return the cached categories as a dictionary of id to type"""
+  return _load_categories()[0]
+
 
 def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
+  app.config.from_mapping(
+    # use an estimate for total_questions on large tables
+    APPROXIMATE_QUESTION_COUNT=False)
+
+  if test_config is not None:
+    app.config.from_mapping(test_config)
+
   setup_db(app)
 
   # Set up CORS. Allow '*' for origins.
@@ -22,20 +95,58 @@ def create_app(test_config=None):
   def after_request(response):
     """ Set Access Control """
 
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, true')
-    response.headers.add('Access-Control-Allow-Methods', 'GET, POST, PATCH, DELETE, OPTIONS')
+    response.headers['Access-Control-Allow-Headers'] = _ACAH
+    response.headers['Access-Control-Allow-Methods'] = _ACAM
 
     return response
 
-  def __get_paginated_questions(request, questions, num_of_questions):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * num_of_questions
-    end = start + num_of_questions
+  def __not_modified(etag):
+    # empty response telling the client its cached copy is current
+    response = app.response_class(status=304)
+    response.set_etag(etag)
 
-    questions = [question.format() for question in questions]
-    current_questions = questions[start:end]
+    return response
+
+  def __get_page_cursor(query, page, num_of_questions):
+    """Translate a page number into a keyset cursor
+    Returns the id of the last question on the previous page,
+    or None when the page is out of bound
+    """
+    if page < 1:
+      return None
+    if page == 1:
+      return 0
+
+    # single index-only lookup of the id that ends the previous page
+    return query.with_entities(Question.id).order_by(Question.id).offset(
+      (page - 1) * num_of_questions - 1).limit(1).scalar()
+
+  def __get_paginated_questions(request, query, num_of_questions):
+    """Get a page of formatted questions and the cursor for the next page
+    The cursor is None when there is no next page
+    """
+    after_id = request.args.get('after_id', None, type=int)
+
+    # fall back to the page query string parameter if no cursor is given
+    if after_id is None:
+      page = request.args.get('page', 1, type=int)
+      after_id = __get_page_cursor(query, page, num_of_questions)
 
-    return current_questions
+      if after_id is None:
+        return [], None
+
+    # seek past the cursor using the primary key index, fetching
+    # one extra question to find out if there is a next page
+    questions = query.filter(Question.id > after_id).order_by(
+      Question.id).limit(num_of_questions + 1).all()
+    current_questions = [question.format() for question in questions[:num_of_questions]]
+
+    # the id of the last question returned is the cursor for the next page
+    next_cursor = None
+    if len(questions) > num_of_questions:
+      next_cursor = current_questions[-1]['id']
+
+    return current_questions, next_cursor
 
   @app.route('/categories')
   def get_all_categories():
@@ -45,18 +156,20 @@ def create_app(test_config=None):
     """
 
     try:
-      categories = Category.query.all()
+      categories_dict, etag = _load_categories()
 
-      # format categories to dictionary
-      categories_dict = {}
-      for category in categories:
-          categories_dict[category.id] = category.type
+      # return 304 if the client already has these categories
+      if request.if_none_match.contains_weak(etag):
+        return __not_modified(etag)
 
       # return successful response
-      return jsonify({
+      response = jsonify({
         'success': True,
         'categories': categories_dict
-      }), 200
+      })
+      response.set_etag(etag)
+
+      return response, 200
     except Exception:
       abort(500)
 
@@ -69,48 +182,74 @@ def create_app(test_config=None):
     QUESTIONS_PER_PAGE is a global variable
     """
 
-    # get all questions and categories
-    questions = Question.query.order_by(Question.id).all()
-    total_questions = len(questions)
-    categories = Category.query.order_by(Category.id).all()
+    # load the categories once so the ETag and body describe the same version
+    categories_dict, categories_etag = _load_categories()
+    etag = None
+
+    # an estimate can't tell when questions change, so conditional
+    # requests are only answered when approximate counts are disabled
+    if app.config['APPROXIMATE_QUESTION_COUNT']:
+      # use the row estimate instead of counting a large table
+      total_questions = _approx_count(Question.__tablename__) or 0
+      if total_questions < APPROXIMATE_COUNT_THRESHOLD:
+        total_questions = db.session.query(func.count(Question.id)).scalar()
+    else:
+      # the newest id and the number of questions identify
+      # the current version of the questions
+      last_id, total_questions = db.session.query(
+        func.max(Question.id), func.count(Question.id)).one()
+      etag = _make_etag(last_id, total_questions, categories_etag)
+
+      # return 304 if the client already has this version
+      if request.if_none_match.contains_weak(etag):
+        return __not_modified(etag)
 
     # get paginated questions
-    current_questions = __get_paginated_questions(request, questions, QUESTIONS_PER_PAGE)
+    questions_query = Question.query
+    current_questions, next_cursor = __get_paginated_questions(
+      request, questions_query, QUESTIONS_PER_PAGE)
 
     # return 404 if there are no questions for the page number
     if (len(current_questions) == 0):
       abort(404)
 
-    # format categories to dictionary
-    categories_dict = {}
-    for category in categories:
-      categories_dict[category.id] = category.type
-
     # return values if there are no errors
-    return jsonify({
+    response = jsonify({
       'success': True,
       'total_questions': total_questions,
       'categories': categories_dict,
-      'questions': current_questions
-    }), 200
+      'questions': current_questions,
+      'next_cursor': next_cursor
+    })
+    if etag is not None:
+      response.set_etag(etag)
+
+    return response, 200
 
   @app.route('/questions/<int:id>', methods=['DELETE'])
   def delete_question(id):
     """Delete specific question
     This endpoint deletes a specific question by the
-    id given as a url parameter
+    id given as a url parameter and returns a 404
+    if the question doesn't exist
     """
     try:
-      question = Question.query.get(id)
-      question.delete()
-
-      return jsonify({
-        'success': True,
-        'message': "Question successfully deleted"
-      }), 200
-    except Exception:
+      # delete the question in a single statement
+      result = db.session.execute(delete(Question).where(Question.id == id))
+      db.session.commit()
+    except SQLAlchemyError:
+      db.session.rollback()
       abort(422)
 
+    # return 404 if there is no question with the id
+    if result.rowcount == 0:
+      abort(404)
+
+    return jsonify({
+      'success': True,
+      'message': "Question successfully deleted"
+    }), 200
+
   @app.route('/questions', methods=['POST'])
   def create_question():
     """This endpoint creates a question.
@@ -163,25 +302,30 @@ def create_app(test_config=None):
     if search_term == '':
       abort(422)
 
-    # add the substring prefix and postfix
-    search_term = '%' + str(search_term) + '%'
+    # escape LIKE wildcards so they match literally in the search term
+    search_term = str(search_term).replace('\\', '\\\\').replace(
+      '%', '\\%').replace('_', '\\_')
 
     try:
       # get all questions that has the search term substring
-      questions = Question.query.filter(Question.question.ilike('{}'.format(search_term))).all()
+      questions_query = Question.query.filter(
+        Question.question.ilike('%{}%'.format(search_term), escape='\\'))
+      total_questions = questions_query.with_entities(func.count(Question.id)).scalar()
+
+      # paginate questions
+      paginated_questions, next_cursor = __get_paginated_questions(
+        request, questions_query, QUESTIONS_PER_PAGE)
 
       # if there are no questions for search term return 404
-      if len(questions) == 0:
+      if len(paginated_questions) == 0:
         abort(404)
 
-      # paginate questions
-      paginated_questions = __get_paginated_questions(request, questions, QUESTIONS_PER_PAGE)
-
       # return response if successful
       return jsonify({
         'success': True,
         'questions': paginated_questions,
-        'total_questions': len(Question.query.all())
+        'total_questions': total_questions,
+        'next_cursor': next_cursor
       }), 200
 
     except Exception:
@@ -193,24 +337,27 @@ def create_app(test_config=None):
   def get_questions_by_category(id):
     """This endpoint handles getting questions by category"""
 
-    # get the category by id
-    category = Category.query.filter_by(id=id).one_or_none()
+    # get the categories to look up the category by id
+    categories = _categories_dict()
 
     # abort 400 for bad request if category isn't found
-    if (category is None):
+    if (id not in categories):
       abort(422)
 
-    questions = Question.query.filter_by(category=id).all()
+    questions_query = Question.query.filter_by(category=id)
+    total_questions = questions_query.with_entities(func.count(Question.id)).scalar()
 
     # paginate questions
-    paginated_questions = __get_paginated_questions(request, questions, QUESTIONS_PER_PAGE)
+    paginated_questions, next_cursor = __get_paginated_questions(
+      request, questions_query, QUESTIONS_PER_PAGE)
 
     # return the results
     return jsonify({
       'success': True,
       'questions': paginated_questions,
-      'total_questions': len(questions),
-      'current_category': category.type
+      'total_questions': total_questions,
+      'current_category': categories[id],
+      'next_cursor': next_cursor
     })
 
   @app.route('/quizzes', methods=['POST'])
@@ -226,70 +373,72 @@ def create_app(test_config=None):
     if ((quiz_category is None) or (previous_questions is None)):
       abort(400)
 
+    # return 400 if previous_questions isn't a list of question ids,
+    # bools are rejected even though they are a subclass of int
+    if ((not isinstance(previous_questions, list)) or
+        (not all(type(question_id) is int for question_id in previous_questions))):
+      abort(400)
+
     # if default value of category is given return all questions
     # else return questions filtered by category
-    if (quiz_category['id'] == 0):
-      questions = Question.query.all()
-    else:
-      questions = Question.query.filter_by(category=quiz_category['id']).all()
-
-    # defines a random question generator method
-    def get_random_question():
-      return questions[random.randint(0, len(questions)-1)]
+    questions_query = Question.query
+    if (quiz_category['id'] != 0):
+      questions_query = questions_query.filter_by(category=quiz_category['id'])
 
-    # get random question for the next question
-    next_question = get_random_question()
+    # exclude previous questions, skipping the filter on the first question
+    if previous_questions:
+      questions_query = questions_query.filter(Question.id.notin_(previous_questions))
 
-    # defines boolean used to check that the question
-    # is not a previous question
-    found = True
+    # let the database pick a random question
+    next_question = questions_query.order_by(func.random()).limit(1).one_or_none()
 
-    while found:
-      if next_question.id in previous_questions:
-        next_question = get_random_question()
-      else:
-        found = False
+    # return no question when every question has been played
+    if next_question is None:
+      return jsonify({
+        'success': True,
+        'question': None,
+      }), 200
 
     return jsonify({
       'success': True,
       'question': next_question.format(),
     }), 200
 
+  def __error_response(status, message):
+    # error bodies never change, so they are serialized once here
+    body = orjson.dumps({
+      'success': False,
+      'error': status,
+      'message': message
+    })
+
+    return body, status, {'Content-Type': 'application/json'}
+
+  bad_request_response = __error_response(400, 'Bad request error')
+  not_found_response = __error_response(404, 'Resource not found')
+  internal_server_error_response = __error_response(
+    500, 'An error has occured, please try again')
+  unprocesable_entity_response = __error_response(422, 'Unprocessable entity')
+
   # Error handler for Bad request error (400)
 
   @app.errorhandler(400)
   def bad_request(error):
-    return jsonify({
-      'success': False,
-      'error': 400,
-      'message': 'Bad request error'
-    }), 400
+    return bad_request_response
 
   # Error handler for resource not found (404)
   @app.errorhandler(404)
   def not_found(error):
-    return jsonify({
-      'success': False,
-      'error': 404,
-      'message': 'Resource not found'
-    }), 404
+    return not_found_response
 
   # Error handler for internal server error (500)
   @app.errorhandler(500)
   def internal_server_error(error):
-    return jsonify({
-      'success': False,
-      'error': 500,
-      'message': 'An error has occured, please try again'
-    }), 500
+    return internal_server_error_response
 
   # Error handler for unprocesable entity (422)
   @app.errorhandler(422)
   def unprocesable_entity(error):
-    return jsonify({
-      'success': False,
-      'error': 422,
-      'message': 'Unprocessable entity'
-    }), 422
+    return unprocesable_entity_response
 
   return app
\ No newline at end of file
@@ -0,0 +1,14 @@
+import os
+
+# The endpoints spend most of their time waiting on Postgres, so each
+# worker runs several threads to overlap those waits. psycopg2 releases
+# the GIL while a query is running.
+#
+# Every thread can hold a database connection, so the workers open up to
+# workers * (pool_size + max_overflow) connections (see models.setup_db).
+# Keep that under the server's max_connections (100 by default) when
+# raising WEB_CONCURRENCY.
+bind = '0.0.0.0:5000'
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = 8
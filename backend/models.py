@@ -1,12 +1,13 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, DDL, create_engine, event
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_name = "trivia_test"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = "postgresql://{}/{}".format('localhost:5432', database_name)
 
-db = SQLAlchemy()
+# keep ORM attributes loaded after commit instead of re-fetching them
+db = SQLAlchemy(session_options={"expire_on_commit": False})
 
 '''
 setup_db(app)
@@ -15,6 +16,17 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # reuse pooled connections and cache compiled SQL for repeated query shapes.
+    # A gunicorn worker serves at most 8 requests at once (threads in
+    # gunicorn.conf.py), so pool_size matches that with a little overflow.
+    # Each worker process opens up to pool_size + max_overflow connections,
+    # so the default 2 workers stay well under Postgres's max_connections.
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": 8,
+        "max_overflow": 2,
+        "pool_pre_ping": True,
+        "query_cache_size": 1200,
+    }
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -25,6 +37,15 @@ Question
 '''
 class Question(db.Model):  
   __tablename__ = 'questions'
+  __table_args__ = (
+    # trigram index so substring searches with ilike can use an index
+    Index(
+      'questions_question_trgm_idx', 'question',
+      postgresql_using='gin',
+      postgresql_ops={'question': 'gin_trgm_ops'}),
+    # lets category listings seek and return rows already ordered by id
+    Index('ix_questions_category_id', 'category', 'id'),
+  )
 
   id = Column(Integer, primary_key=True)
   question = Column(String)
@@ -58,6 +79,11 @@ class Question(db.Model):
       'difficulty': self.difficulty
     }
 
+# the trigram operator class needs the pg_trgm extension to exist
+event.listen(
+  Question.__table__, 'before_create',
+  DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
 '''
 Category
 
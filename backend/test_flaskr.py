@@ -15,7 +15,7 @@ class TriviaTestCase(unittest.TestCase):
         self.app = create_app()
         self.client = self.app.test_client
         self.database_name = "trivia_test"
-        self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
+        self.database_path = "postgresql://{}/{}".format('localhost:5432', self.database_name)
         setup_db(self.app, self.database_path)
 
         # binds the app to the current context
@@ -46,6 +46,40 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['categories'])
         self.assertEqual(len(data['categories']), 6)
 
+    def test_get_all_categories_not_modified(self):
+        """Test for conditional get_all_categories
+        Tests that sending back the ETag of the categories
+        returns a 304 status code without a body
+        """
+
+        # get the ETag of the current categories
+        etag = self.client().get('/categories').headers['ETag']
+
+        # make conditional request
+        response = self.client().get(
+            '/categories', headers={'If-None-Match': etag})
+
+        # make assertions on the response
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_get_all_categories_not_modified_weak_etag(self):
+        """Test for conditional get_all_categories with a weak ETag
+        Proxies that compress responses send the ETag back in
+        its weak form, which should still return a 304
+        """
+
+        # get the ETag of the current categories in its weak form
+        etag = self.client().get('/categories').headers['ETag']
+
+        # make conditional request
+        response = self.client().get(
+            '/categories', headers={'If-None-Match': 'W/' + etag})
+
+        # make assertions on the response
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
     def __create_test_question(self):
         """This creates a test question in the database.
         This test data is created to prevent having to drop
@@ -99,6 +133,112 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Resource not found')
 
+    def test_get_paginated_questions_after_cursor(self):
+        """Test for keyset pagination
+        This tests that the next_cursor returned with a page
+        fetches the questions that come after that page
+        """
+
+        # get the first page and the cursor for the next page
+        first_page = self.client().get('/questions').get_json()
+        next_cursor = first_page['next_cursor']
+
+        # make request and process response
+        response = self.client().get(
+            '/questions?after_id={}'.format(next_cursor))
+        data = response.get_json()
+
+        # make assertions on the response data
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['questions'])
+        self.assertTrue(all(
+            question['id'] > next_cursor for question in data['questions']))
+
+    def test_get_paginated_questions_last_page_cursor(self):
+        """Test for the cursor of the last page
+        This follows next_cursor from the first page and
+        ensures every page is found and the last page
+        returns no cursor
+        """
+
+        # make request for the first page
+        response = self.client().get('/questions')
+        data = response.get_json()
+
+        # follow the cursors until the last page
+        while data['next_cursor'] is not None:
+            response = self.client().get(
+                '/questions?after_id={}'.format(data['next_cursor']))
+            data = response.get_json()
+
+            # make assertions on the response data
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(data['questions'])
+
+        # make assertions on the last page
+        self.assertIsNone(data['next_cursor'])
+        self.assertLessEqual(len(data['questions']), 10)
+
+    def test_get_paginated_questions_approximate_count(self):
+        """Test for approximate question count
+        This tests that with APPROXIMATE_QUESTION_COUNT enabled
+        a small table still returns the exact count and the
+        response has no ETag
+        """
+
+        # create an app with approximate count enabled
+        app = create_app({'APPROXIMATE_QUESTION_COUNT': True})
+        setup_db(app, self.database_path)
+
+        # make requests and process responses
+        exact_data = self.client().get('/questions').get_json()
+        response = app.test_client().get('/questions')
+        data = response.get_json()
+
+        # make assertions on the response data
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_questions'], exact_data['total_questions'])
+        self.assertNotIn('ETag', response.headers)
+
+    def test_get_paginated_questions_not_modified(self):
+        """Test for conditional get paginated questions
+        Tests that sending back the ETag of the questions
+        returns a 304 status code without a body
+        """
+
+        # get the ETag of the current questions
+        etag = self.client().get('/questions').headers['ETag']
+
+        # make conditional request
+        response = self.client().get(
+            '/questions', headers={'If-None-Match': etag})
+
+        # make assertions on the response
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_get_paginated_questions_etag_changes(self):
+        """Test that the questions ETag changes
+        This tests that creating and deleting a question
+        each give the questions a new ETag
+        """
+
+        # get the ETag of the current questions
+        etag_before = self.client().get('/questions').headers['ETag']
+
+        # create test question and get the new ETag
+        test_question_id = self.__create_test_question()
+        etag_created = self.client().get('/questions').headers['ETag']
+
+        # delete test question and get the new ETag
+        self.client().delete('/questions/{}'.format(test_question_id))
+        etag_deleted = self.client().get('/questions').headers['ETag']
+
+        # make assertions on the ETags
+        self.assertNotEqual(etag_created, etag_before)
+        self.assertNotEqual(etag_deleted, etag_created)
+
     def test_delete_question(self):
         """Test for deleting a question.
         __create_test_question function is used to prevent having
@@ -136,9 +276,9 @@ class TriviaTestCase(unittest.TestCase):
         data = response.get_json()
 
         # make assertions on the response data
-        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.status_code, 404)
         self.assertEqual(data['success'], False)
-        self.assertEqual(data['message'], 'Unprocessable entity')
+        self.assertEqual(data['message'], 'Resource not found')
 
     def test_delete_question_id_doesnot_exist(self):
         """Tests deletion of question id that doesn't exist
@@ -150,9 +290,9 @@ class TriviaTestCase(unittest.TestCase):
         data = response.get_json()
 
         # make assertions on the response data
-        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.status_code, 404)
         self.assertEqual(data['success'], False)
-        self.assertEqual(data['message'], 'Unprocessable entity')
+        self.assertEqual(data['message'], 'Resource not found')
 
     def test_delete_question_invalid_id(self):
         """Tests deletion of question with invalid id"""
@@ -221,6 +361,7 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertEqual(len(data['questions']), 1)
+        self.assertEqual(data['total_questions'], 1)
 
     def test_search_term_empty_data(self):
         """Test for empty search term."""
@@ -256,6 +397,23 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'Resource not found')
 
+    def test_search_term_wildcards(self):
+        """Test for search terms with LIKE wildcards
+        This tests that % and _ only match literally, so
+        they don't match every question
+        """
+
+        for search_term in ['%', '_']:
+            # make request and process response
+            response = self.client().post(
+                '/questions/search', json={'searchTerm': search_term})
+            data = response.get_json()
+
+            # make assertions on the response data
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(data['success'], False)
+            self.assertEqual(data['message'], 'Resource not found')
+
     def test_get_questions_by_category(self):
         """Test for getting questions by category."""
 
@@ -305,6 +463,49 @@ class TriviaTestCase(unittest.TestCase):
         self.assertNotEqual(data['question']['id'], 9)
         self.assertEqual(data['question']['category'], 4)
 
+    def test_quiz_no_questions_left(self):
+        """Tests playing quiz when all questions have been played"""
+
+        # request data with every Sports question already played
+        request_data = {
+            'previous_questions': [10, 11],
+            'quiz_category': {
+                'type': 'Sports',
+                'id': 6
+            }
+        }
+
+        # make request and process response
+        response = self.client().post('/quizzes', json=request_data)
+        data = response.get_json()
+
+        # make assertions on the response data
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertIsNone(data['question'])
+
+    def test_quiz_invalid_previous_questions(self):
+        """Test for previous questions that aren't question ids"""
+
+        for previous_questions in [[[1]], [True]]:
+            # request data
+            request_data = {
+                'previous_questions': previous_questions,
+                'quiz_category': {
+                    'type': 'History',
+                    'id': 4
+                }
+            }
+
+            # make request and process response
+            response = self.client().post('/quizzes', json=request_data)
+            data = response.get_json()
+
+            # make assertions on the response data
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['success'], False)
+            self.assertEqual(data['message'], 'Bad request error')
+
     def test_no_data_to_play_quiz(self):
         """Test for the case where no data is sent"""
 